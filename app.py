@@ -12,6 +12,57 @@ load_dotenv()
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Column types for the required columns; 'ALICI' must stay a string so it is not treated as a number
+CSV_DTYPES = {'ALICI': 'string', 'IZIN TURU': 'string', 'IZIN KAYNAGI': 'string', 'ONAY(1)-RET(0)': 'int8', 'IZIN TARIHI': 'string'}
+CSV_CHUNK_ROWS = 10_000
+KEY_COLUMNS = ['ALICI', 'IZIN TURU']
+
+
+def read_csv_chunks(file):
+    """Yields the CSV as DataFrame chunks, using pyarrow's streaming reader when it is installed."""
+    file.seek(0)
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        yield from pd.read_csv(file, dtype=CSV_DTYPES, chunksize=CSV_CHUNK_ROWS, engine='c', low_memory=False, cache_dates=True)
+        return
+
+    # Every column gets an explicit type: pyarrow would otherwise guess the types of extra columns from the
+    # first block and fail partway through the file when a later block disagrees
+    header = pd.read_csv(file, nrows=0).columns
+    file.seek(0)
+    column_types = {column: pa.string() for column in header}
+    column_types.update({column: pa.int8() if dtype == 'int8' else pa.string() for column, dtype in CSV_DTYPES.items()})
+    reader = pa_csv.open_csv(file, read_options=pa_csv.ReadOptions(block_size=1 << 20),
+                             convert_options=pa_csv.ConvertOptions(column_types=column_types))
+    # pyarrow reads byte-sized blocks; re-slice them into CSV_CHUNK_ROWS-row chunks like the fallback path
+    pending = reader.schema.empty_table()
+    yielded = False
+    for batch in reader:
+        pending = pa.concat_tables([pending, pa.Table.from_batches([batch])])
+        while pending.num_rows >= CSV_CHUNK_ROWS:
+            yield pending.slice(0, CSV_CHUNK_ROWS).to_pandas(types_mapper=pd.ArrowDtype)
+            yielded = True
+            pending = pending.slice(CSV_CHUNK_ROWS)
+    if pending.num_rows or not yielded:
+        # A header-only file still yields its columns so they can be validated
+        yield pending.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_csv_keys(file) -> pd.DataFrame:
+    """Reads only the deduplication key columns of the whole file, with the same engine as read_csv_chunks."""
+    file.seek(0)
+    try:
+        import pyarrow as pa
+        from pyarrow import csv as pa_csv
+    except ImportError:
+        return pd.read_csv(file, usecols=KEY_COLUMNS, dtype='string', engine='c')
+
+    convert_options = pa_csv.ConvertOptions(column_types={column: pa.string() for column in KEY_COLUMNS}, include_columns=KEY_COLUMNS)
+    return pa_csv.read_csv(file, convert_options=convert_options).to_pandas(types_mapper=pd.ArrowDtype)
+
+
 st.set_page_config(page_title="IYS Toplu İzin Yükleme", layout="wide")
 
 st.title("IYS Toplu İzin Yükleme Servisi")
@@ -37,8 +88,9 @@ uploaded_file = st.file_uploader("Detaylı izin dosyasını (CSV) buraya sürük
 
 if uploaded_file:
     try:
-        # Ensure the 'ALICI' column is read as a string to prevent it being treated as a number
-        df = pd.read_csv(uploaded_file, dtype={'ALICI': str})
+        # The file is read in chunks so uploading can start before the whole file is parsed.
+        reader = read_csv_chunks(uploaded_file)
+        df = next(reader)
         st.header("2. Veri Önizlemesi ve Doğrulama")
         st.dataframe(df.head(), use_container_width=True)
         required_columns = {'ALICI', 'ONAY(1)-RET(0)', 'IZIN TARIHI', 'IZIN TURU', 'IZIN KAYNAGI'}
@@ -49,12 +101,17 @@ if uploaded_file:
             st.success("Tüm gerekli kolonlar bulundu.")
             st.header("3. Yüklemeyi Başlatın")
             if st.button("İzinleri İYS'ye Yükle", type="primary", key="add_button"):
-                uploader = IYSConsentUploader()
+                # A plain dict in session state keeps the token between reruns and is safe to use from worker threads
+                uploader = IYSConsentUploader(token_cache=st.session_state.setdefault('iys_token_cache', {}))
                 with st.spinner("İYS'ye bağlanılıyor ve yükleme işlemi başlatılıyor..."):
                     st.subheader("Yükleme Günlüğü")
                     progress_bar = st.progress(0, text="Yükleme durumu")
                     log_area = st.container(height=300)
-                    for result in uploader.process_dataframe(df):
+                    # A cheap pass over the key columns lets duplicates be removed across the whole file, not per chunk
+                    keys = read_csv_keys(uploaded_file)
+                    keep_rows = uploader.last_occurrence_mask(keys)
+                    reader = read_csv_chunks(uploaded_file)
+                    for result in uploader.process_dataframe(reader, total_rows=len(keys), keep_rows=keep_rows):
                         progress = result.get('progress', 0); message = result.get('message', ''); status = result.get('status', 'info')
                         progress_bar.progress(progress, text=f"İşlem ilerlemesi: {int(progress * 100)}%")
                         if status == 'success': log_area.success(message)
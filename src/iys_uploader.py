@@ -1,16 +1,130 @@
 import requests
+import numpy as np
+import orjson
 import pandas as pd
 import time
+import functools
+import gc
+import itertools
 import logging
+import math
 import os
+import queue
+import random
+import re
+import tempfile
+import threading
 import urllib.parse
-from typing import Any, Generator, Dict
+from typing import Any, Callable, Generator, Dict, Iterable, Iterator, List, MutableMapping, Optional, Tuple, Union
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+_NON_DIGIT = re.compile(r'\D')
+# The poll history file is shared by every uploader (and Streamlit session) in this process
+_POLL_HISTORY_LOCK = threading.Lock()
+# 'IZIN TARIHI' as expected in the CSV: DD-MM-YYYY HH:MM:SS
+_CSV_DATE = r'^\d{2}-\d{2}-\d{4} \d{2}:\d{2}:\d{2}$'
+# Item statuses meaning IYS has not finished processing the request yet
+_IN_PROGRESS = frozenset({'enqueue', 'processing', 'pending', 'in_progress'})
+# Status updates that are passed to the UI immediately instead of being batched
+_FLUSH_STATUSES = frozenset({'success', 'error', 'complete'})
+# One consent object; type and source are already JSON literals, the other fields only hold safe characters
+_CONSENT_TEMPLATE = '{"recipient":"%s","type":%s,"source":%s,"status":"%s","consentDate":"%s","recipientType":"BIREYSEL"}'
+
+def _lognormal_poll_times(samples: List[float], k: int) -> List[float]:
+    """Returns k poll times minimizing the expected detection delay for a lognormal fit of `samples`.
+
+    The times follow L_i = (F(L_{i-1}) - F(L_{i-2})) / p(L_{i-1}) + L_{i-1} with L_0 = 0, and L_1 is
+    chosen by bisection so that L_k lands on the 99th percentile of the fitted distribution.
+    """
+    logs = [math.log(t) for t in samples if t > 0]
+    if not logs:
+        return []
+    mu = sum(logs) / len(logs)
+    sigma = math.sqrt(sum((x - mu) ** 2 for x in logs) / len(logs))
+    if sigma <= 0:
+        return []
+
+    def cdf(t: float) -> float:
+        return 0.5 * (1 + math.erf((math.log(t) - mu) / (sigma * math.sqrt(2)))) if t > 0 else 0.0
+
+    def pdf(t: float) -> float:
+        if t <= 0:
+            return 0.0
+        return math.exp(-((math.log(t) - mu) ** 2) / (2 * sigma ** 2)) / (t * sigma * math.sqrt(2 * math.pi))
+
+    def schedule(first: float) -> List[float]:
+        times = [0.0, first]
+        for _ in range(k - 1):
+            density = pdf(times[-1])
+            if density <= 0:
+                return times[1:] + [math.inf]
+            times.append((cdf(times[-1]) - cdf(times[-2])) / density + times[-1])
+        return times[1:]
+
+    target = math.exp(mu + 2.326 * sigma)  # 99th percentile
+    low, high = 0.0, target
+    for _ in range(60):
+        first = (low + high) / 2
+        if schedule(first)[-1] < target:
+            low = first
+        else:
+            high = first
+    times = schedule(high)
+    return times[:k] if all(math.isfinite(t) for t in times[:k]) else []
+
+class TokenBucket:
+    """Thread-safe token bucket that limits calls to `rate` per second with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until a token is available and consumes it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
 class IYSConsentUploader:
-    def __init__(self):
+    # Number of consents sent per IYS request and number of requests in flight at once
+    chunk_size = 1000
+    max_workers = 8
+    # Minimum seconds between non-final status updates sent to the UI
+    update_interval = 0.2
+    # (connect, read) timeout in seconds for every IYS call, so a stalled socket cannot hang a worker
+    request_timeout = (5, 30)
+    # Polling starts early and backs off geometrically, giving up after poll_timeout seconds
+    poll_initial_delay = 2.0
+    poll_growth = 1.6
+    poll_timeout = 120.0
+    # Observed completion times; once enough are logged, poll times are placed from their distribution
+    poll_history_path = 'iys_poll_history.csv'
+    poll_history_size = 200
+    poll_history_min_samples = 5
+    poll_count = 8
+    # Never poll more often than poll_initial_delay, nor more than poll_max_attempts times per request
+    poll_max_attempts = 12
+    # Backoff for server errors while checking status: base * 2^attempt plus jitter, capped
+    status_max_attempts = 5
+    status_backoff_base = 1.0
+    status_backoff_cap = 30.0
+
+    def __init__(self, token_cache: Optional[MutableMapping] = None):
+        """`token_cache` is a dict kept in st.session_state so the token survives Streamlit reruns."""
         self.token_url = "https://api.iys.org.tr/oauth2/token"
         
         # IYS Numaranız ve Marka Kodunuzu buraya girin
@@ -26,12 +140,45 @@ class IYSConsentUploader:
         self.password = os.getenv("IYS_PASSWORD")
         self.access_token = None
         self.brand_code = brand_code
+        self.token_cache = token_cache
+        # Only one thread may re-authenticate at a time
+        self._token_lock = threading.RLock()
+        # Keep all API calls under the IYS rate limit, even with several chunks in flight
+        self._limiter = TokenBucket(rate=5.0, burst=10)
+        self._poll_schedule = None
 
         if not self.username or not self.password:
             raise ValueError("IYS_USERNAME and IYS_PASSWORD must be set as environment variables (Streamlit Secrets or server environment variables).")
 
-    def get_token(self) -> bool:
-        """Fetches the OAuth2 token from IYS. Returns True on success, False on failure."""
+        # Reuse TCP/TLS connections to api.iys.org.tr across all calls
+        self.session = requests.Session()
+        # Status-based retries are limited to 429/503, which are safe for POST too; other 5xx on
+        # status checks are retried with backoff in check_consent_status
+        # read=0: a POST whose response was lost may already have been accepted, so it must not be resent
+        retry = Retry(total=5, read=0, backoff_factor=0.5, status_forcelist=[429, 503],
+                      allowed_methods=['GET', 'POST'], respect_retry_after_header=True, raise_on_status=False)
+        # requests/urllib3 speak HTTP/1.1 only, so every chunk in flight gets its own TCP socket
+        # instead of sharing one multiplexed HTTP/2 connection. Keep it that way (e.g. httpx with
+        # http2=False) and size the pool above max_workers so no worker waits for a connection.
+        self.session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=retry))
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Connection': 'keep-alive'
+        })
+
+    def get_token(self, use_cache: bool = True) -> bool:
+        """Fetches the OAuth2 token from IYS, reusing a cached one until shortly before it expires. Returns True on success, False on failure."""
+        with self._token_lock:
+            cached = self.token_cache.get('iys_token') if self.token_cache is not None else None
+            if use_cache and cached and time.time() < cached['exp']:
+                self.access_token = cached['token']
+                self.session.headers['Authorization'] = f'Bearer {self.access_token}'
+                logging.info("Using cached IYS token.")
+                return True
+            return self._fetch_token()
+
+    def _fetch_token(self) -> bool:
+        """Requests a new OAuth2 token from IYS and stores it in the token cache."""
         logging.info("Attempting to get IYS token...")
         try:
             payload = {
@@ -39,15 +186,22 @@ class IYSConsentUploader:
                 'username': self.username,
                 'password': self.password
             }
-            headers = {
-                'Content-Type': 'application/x-www-form-urlencoded',
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
             payload_encoded = urllib.parse.urlencode(payload)
-            response = requests.post(self.token_url, data=payload_encoded, headers=headers)
+            self._limiter.acquire()
+            response = self.session.post(self.token_url, data=payload_encoded, headers=headers,
+                                         timeout=self.request_timeout)
             response.raise_for_status()
-            self.access_token = response.json().get('access_token')
+            response_json = orjson.loads(response.content)
+            self.access_token = response_json.get('access_token')
             if self.access_token:
+                self.session.headers['Authorization'] = f'Bearer {self.access_token}'
+                if getattr(response.raw, 'version', 11) != 11:
+                    logging.warning(f"Unexpected HTTP version from IYS: {response.raw.version}")
+                expires_in = response_json.get('expires_in')
+                if self.token_cache is not None and expires_in:
+                    # Refresh a minute early so a request never goes out with an expiring token
+                    self.token_cache['iys_token'] = {'token': self.access_token, 'exp': time.time() + int(expires_in) - 60}
                 logging.info("Successfully obtained IYS token.")
                 return True
             else:
@@ -57,39 +211,87 @@ class IYSConsentUploader:
             error_details = e.response.text if e.response else "No response from server"
             logging.error(f"API Error during token fetch - {str(e)} | Details: {error_details}")
             return False
+        except orjson.JSONDecodeError as e:
+            logging.error(f"Invalid JSON in token response - {str(e)}")
+            return False
 
-    def format_phone_number(self, phone: Any) -> str:
-        """Formats the phone number to the required +90 E.164 format."""
+    @staticmethod
+    @functools.lru_cache(maxsize=131072)
+    def format_phone_number(phone: Any) -> str:
+        """Formats the phone number to the required +90 E.164 format, or returns '' if it has no digits."""
         phone_str = str(phone).strip()
         # Remove .0 suffix if it exists (from float conversion)
         if phone_str.endswith('.0'):
             phone_str = phone_str[:-2]
+        # Drop the trunk/international prefix zeros, e.g. 0532... or 0090532...
+        digits = _NON_DIGIT.sub('', phone_str).lstrip('0')
+        if not digits:
+            return ''
+        return '+' + (digits if digits.startswith('90') else '90' + digits)
 
-        if not phone_str.startswith('+'):
-            if phone_str.startswith('90'):
-                phone_str = '+' + phone_str
-            # Standard Turkish mobile numbers are 10 digits (e.g., 5xxxxxxxxx)
-            elif len(phone_str) == 10:
-                phone_str = '+90' + phone_str
-            else:
-                # Fallback for numbers that might already include country code but no +
-                phone_str = '+' + phone_str
-        return phone_str
+    def build_consent_list(self, df: pd.DataFrame) -> List[Tuple[str, str, str, str, str]]:
+        """Builds (recipient, type, source, status, consentDate) rows for _CONSENT_TEMPLATE from a deduplicated
+        DataFrame with non-empty, upper-cased 'IZIN TURU'. Rows with an invalid date or phone number are skipped."""
+        # Format each distinct number once; bulk files often repeat a recipient across permission types
+        recipients = df['ALICI']
+        phones = recipients.map({value: self.format_phone_number(value) for value in recipients.unique()})
+        dates = df['IZIN TARIHI'].astype(str)
+        if dates.str.match(_CSV_DATE).all():
+            # Fast path: reorder DD-MM-YYYY into YYYY-MM-DD without parsing
+            consent_dates = dates.str.slice(6, 10) + '-' + dates.str.slice(3, 5) + '-' + dates.str.slice(0, 2) + dates.str.slice(10)
+        else:
+            consent_dates = pd.to_datetime(dates, format='%d-%m-%Y %H:%M:%S', cache=True, errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+        status = np.where(df['ONAY(1)-RET(0)'].astype(int).to_numpy() == 1, 'ONAY', 'RET')
+
+        # Type and source come from the user's file, so they are stored as escaped JSON literals;
+        # encoding each distinct value once keeps this cheap
+        types = df['IZIN TURU']
+        types = types.map({value: orjson.dumps(value).decode() for value in types.unique()})
+        # Ensure source is a string to prevent errors with empty cells (NaN)
+        sources = df['IZIN KAYNAGI'].fillna('').astype(str)
+        sources = sources.map({value: orjson.dumps(value).decode() for value in sources.unique()})
 
-    def add_consents(self, consent_data: list) -> str:
-        """Submits a consent request and returns the request ID."""
+        # Rows whose date could not be parsed, or whose number is not '+90' plus 10 digits, are left out
+        valid = (consent_dates.notna() & (phones.str.len() == 13)).to_numpy()
+        return list(zip(phones.to_numpy()[valid], types.to_numpy()[valid], sources.to_numpy()[valid],
+                        status[valid], consent_dates.to_numpy()[valid]))
+
+    def chunk_iter(self, lst: list, size: int) -> Iterator[list]:
+        """Lazily yields sublists of at most `size` items."""
+        it = iter(lst)
+        return iter(lambda: list(itertools.islice(it, size)), [])
+
+    def _ensure_token(self, stale_token: Optional[str] = None) -> None:
+        """Fetches a token if there is none yet, or if the current one is still `stale_token`."""
+        with self._token_lock:
+            # Another thread may already have refreshed the token while we waited
+            if self.access_token and self.access_token != stale_token:
+                return
+            # A rejected token may still be in the cache, so fetch a new one in that case
+            if not self.get_token(use_cache=stale_token is None):
+                raise ConnectionError("Failed to authenticate with IYS.")
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends an authenticated request, re-authenticating once on 401."""
         if not self.access_token:
-            if not self.get_token():
-                raise ConnectionError("Failed to authenticate with IYS. Cannot add consents.")
+            self._ensure_token()
+        token = self.access_token
+        self._limiter.acquire()
+        response = self.session.request(method, url, timeout=self.request_timeout, **kwargs)
+        if response.status_code == 401:
+            logging.info("IYS token rejected, re-authenticating...")
+            self._ensure_token(stale_token=token)
+            self._limiter.acquire()
+            response = self.session.request(method, url, timeout=self.request_timeout, **kwargs)
+        response.raise_for_status()
+        return response
 
+    def add_consents(self, consent_data: List[Tuple[str, str, str, str, str]]) -> str:
+        """Submits a consent request built from build_consent_list rows and returns the request ID."""
         logging.info(f"Submitting consent request for {len(consent_data)} recipients...")
-        headers = {
-            'Authorization': f'Bearer {self.access_token}',
-            'Content-Type': 'application/json'
-        }
-        response = requests.post(self.consent_url, json=consent_data, headers=headers)
-        response.raise_for_status()
-        response_json = response.json()
+        body = ('[' + ','.join(_CONSENT_TEMPLATE % row for row in consent_data) + ']').encode()
+        response = self._send('POST', self.consent_url, data=body, headers={'Content-Type': 'application/json'})
+        response_json = orjson.loads(response.content)
         request_id = response_json.get("requestId")
         if not request_id:
             raise ValueError(f"Could not get requestId from IYS. Response: {response_json}")
@@ -98,19 +300,299 @@ class IYSConsentUploader:
 
     def check_consent_status(self, request_id: str) -> Dict:
         """Checks the status of a previously submitted consent request."""
-        if not self.access_token:
-            if not self.get_token():
-                raise ConnectionError("Failed to authenticate with IYS. Cannot check status.")
-        
         status_url = self.status_url_template.format(request_id)
-        headers = {'Authorization': f'Bearer {self.access_token}'}
         logging.info(f"Checking status for request {request_id}...")
-        response = requests.get(status_url, headers=headers)
-        response.raise_for_status()
-        return response.json()
+        # The status check is idempotent, so transient server and network errors are retried with jittered backoff
+        for attempt in range(self.status_max_attempts):
+            try:
+                response = self._send('GET', status_url)
+                break
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code < 500 or attempt == self.status_max_attempts - 1:
+                    raise
+                reason = e.response.status_code
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.status_max_attempts - 1:
+                    raise
+                reason = type(e).__name__
+            delay = min(self.status_backoff_cap, self.status_backoff_base * 2 ** attempt + random.random())
+            logging.warning(f"Status check for {request_id} failed ({reason}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
+        return orjson.loads(response.content)
+
+    def _load_poll_history(self) -> List[float]:
+        """Reads the logged completion times (seconds) of previous requests, skipping malformed lines."""
+        try:
+            with open(self.poll_history_path) as f:
+                lines = f.read().splitlines()[-self.poll_history_size:]
+        except OSError:
+            return []
+        history = []
+        for line in lines:
+            try:
+                history.append(float(line.split(',')[1]))
+            except (ValueError, IndexError):
+                continue
+        return history
+
+    def _record_poll_time(self, chunk_size: int, seconds: float) -> None:
+        """Appends a completion time to the history file, keeping only the latest entries."""
+        with _POLL_HISTORY_LOCK:
+            try:
+                try:
+                    with open(self.poll_history_path) as f:
+                        lines = f.read().splitlines()
+                except FileNotFoundError:
+                    lines = []
+                lines = lines[-(self.poll_history_size - 1):] + [f"{chunk_size},{seconds:.2f}"]
+                # Write a temporary file and swap it in, so readers never see a truncated file
+                directory = os.path.dirname(os.path.abspath(self.poll_history_path))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'w') as f:
+                        f.write('\n'.join(lines) + '\n')
+                    os.replace(tmp_path, self.poll_history_path)
+                except BaseException:
+                    os.unlink(tmp_path)
+                    raise
+            except OSError as e:
+                logging.warning(f"Could not write poll history: {str(e)}")
+
+    def poll_delays(self) -> List[float]:
+        """Returns the waits between status checks.
+
+        With enough history, the first poll_count checks are placed from the observed completion times.
+        Otherwise, or after those, the waits grow geometrically until poll_timeout, with at most
+        poll_max_attempts checks in total.
+        """
+        history = self._load_poll_history()
+        times = _lognormal_poll_times(history, self.poll_count) if len(history) >= self.poll_history_min_samples else []
+        # A narrow fit can place polls milliseconds apart, so enforce a minimum gap
+        delays = [max(b - a, self.poll_initial_delay) for a, b in zip([0.0] + times, times)]
+        elapsed = sum(delays)
+        delay = max(delays[-1], self.poll_initial_delay) * self.poll_growth if delays else self.poll_initial_delay
+        while elapsed < self.poll_timeout and len(delays) < self.poll_max_attempts:
+            delays.append(delay)
+            elapsed += delay
+            delay *= self.poll_growth
+        if elapsed < self.poll_timeout:
+            # Out of attempts: make the last check wait until poll_timeout before giving up
+            delays[-1] += self.poll_timeout - elapsed
+        return delays
+
+    def check_request_status(self, request_id: str, on_poll: Optional[Callable[[int, int], None]] = None) -> Optional[list]:
+        """Polls a consent request until no item is being processed. Returns None on timeout.
+
+        `on_poll(attempt, attempts)` is called after every status check, e.g. to report progress.
+        """
+        delays = self._poll_schedule or self.poll_delays()
+        started = last_pending = time.monotonic()
+        for attempt, delay in enumerate(delays, start=1):
+            time.sleep(delay)
+            status_result = self.check_consent_status(request_id)
+            checked = time.monotonic()
+            if on_poll is not None:
+                on_poll(attempt, len(delays))
 
-    def process_dataframe(self, df: pd.DataFrame) -> Generator[Dict[str, Any], None, None]:
-        """Processes a DataFrame and yields status updates."""
+            if isinstance(status_result, list) and status_result:
+                # The job is done only if NO items are currently being processed.
+                processing = sum(1 for item in status_result if item.get("status", "").lower() in _IN_PROGRESS)
+                if processing == 0:
+                    # The job finished somewhere between the last pending check and this one
+                    self._record_poll_time(len(status_result), (last_pending + checked) / 2 - started)
+                    return status_result
+                logging.info(f"Request {request_id}: {processing}/{len(status_result)} items still processing.")
+            last_pending = checked
+        return None
+
+    def _upload_chunk(self, chunk: list, events: Optional[queue.Queue] = None) -> Tuple[Optional[str], Optional[list], Optional[Exception]]:
+        """Submits one chunk and waits for its result. Runs in a worker thread.
+
+        Errors are returned instead of raised, together with the request ID if the chunk was already submitted.
+        """
+        request_id = None
+        try:
+            request_id = self.add_consents(chunk)
+            on_poll = None
+            if events is not None:
+                on_poll = lambda attempt, attempts: events.put(('poll', (request_id, attempt, attempts)))
+            status_result = self.check_request_status(request_id, on_poll)
+        except Exception as e:
+            return request_id, None, e
+        return request_id, status_result, None
+
+    @staticmethod
+    def last_occurrence_mask(keys: pd.DataFrame) -> np.ndarray:
+        """Returns a boolean mask keeping only the last row of each ('ALICI', 'IZIN TURU') pair."""
+        return ~keys.duplicated(subset=['ALICI', 'IZIN TURU'], keep='last').to_numpy()
+
+    def _produce_chunks(self, frames: Iterable[pd.DataFrame], keep_rows: Optional[np.ndarray], chunk_queue: queue.Queue, events: queue.Queue, stats: Dict[str, int], stop: threading.Event) -> None:
+        """Builds consent chunks from the DataFrames and queues them for upload. Runs in its own thread."""
+        try:
+            if keep_rows is not None:
+                removed_count = int((~keep_rows).sum())
+                if removed_count:
+                    events.put(('event', {'status': 'warning', 'message': f"{removed_count} adet tekrar eden kayıt bulundu ve listeden kaldırıldı."}))
+            offset = 0
+            for df in frames:
+                if stop.is_set():
+                    break
+                if keep_rows is not None:
+                    # Deduplicate with the whole-file mask so a later row always wins, even across chunks
+                    frame_mask = keep_rows[offset:offset + len(df)]
+                    if len(frame_mask) != len(df):
+                        raise ValueError("Satır sayısı tekrar kontrolü ile uyuşmuyor; dosya okunurken değişmiş olabilir.")
+                    df_deduplicated = df[frame_mask].reset_index(drop=True)
+                    offset += len(df)
+                else:
+                    # Deduplicate based on recipient and type
+                    original_count = len(df)
+                    df_deduplicated = df.drop_duplicates(subset=['ALICI', 'IZIN TURU'], keep='last', ignore_index=True)
+                    deduplicated_count = len(df_deduplicated)
+                    if original_count > deduplicated_count:
+                        removed_count = original_count - deduplicated_count
+                        events.put(('event', {'status': 'warning', 'message': f"{removed_count} adet tekrar eden kayıt bulundu ve listeden kaldırıldı."}))
+
+                # Skip rows with no permission type
+                df_deduplicated['IZIN TURU'] = df_deduplicated['IZIN TURU'].fillna('').astype(str).str.upper()
+                df_deduplicated = df_deduplicated[df_deduplicated['IZIN TURU'] != '']
+
+                consent_list = self.build_consent_list(df_deduplicated)
+                invalid_count = len(df_deduplicated) - len(consent_list)
+                if invalid_count:
+                    events.put(('event', {'status': 'warning', 'message': f"{invalid_count} adet kayıt geçersiz izin tarihi veya telefon numarası nedeniyle atlandı."}))
+                if consent_list:
+                    total_chunks = math.ceil(len(consent_list) / self.chunk_size)
+                    stats['submitted'] += total_chunks
+                    events.put(('event', {'status': 'info', 'message': f"{len(consent_list)} adet izin isteği {total_chunks} parça halinde gönderiliyor..."}))
+                    for chunk in self.chunk_iter(consent_list, self.chunk_size):
+                        chunk_queue.put(chunk)
+
+                # Release the parsed chunk before reading the next one
+                del df, df_deduplicated, consent_list
+                gc.collect()
+        except Exception as e:
+            events.put(('error', e))
+        finally:
+            # One poison pill per worker
+            for _ in range(self.max_workers):
+                chunk_queue.put(None)
+
+    def _consume_chunks(self, chunk_queue: queue.Queue, events: queue.Queue, stop: threading.Event) -> None:
+        """Uploads queued chunks until a poison pill arrives. Runs in a worker thread."""
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is None:
+                break
+            if stop.is_set():
+                # Keep draining so the producer never blocks on a full queue
+                events.put(('skipped', chunk))
+                continue
+            events.put(('chunk', (chunk, self._upload_chunk(chunk, events))))
+        events.put(('done', None))
+
+    def _report_chunk(self, chunk: list, result: Tuple[Optional[str], Optional[list], Optional[Exception]], progress: float, counts: Dict[str, int]) -> Generator[Dict[str, Any], None, None]:
+        """Yields status updates for a finished chunk and adds its results to `counts`."""
+        request_id, status_result, error = result
+        if error is not None:
+            if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+                error_details = error.response.text
+                message = f"API Hatası ({error.response.status_code}): Sunucu gönderilen veriyi geçersiz buldu. Detaylar: {error_details}"
+            else:
+                error_details = "No details from server."
+                message = f"Bağlantı veya yanıt hatası: {str(error)}"
+            logging.error(f"API Error (request {request_id}) - {str(error)} | Details: {error_details}")
+            if request_id is None:
+                # The chunk never reached IYS
+                counts['failure'] += len(chunk)
+                yield {'status': 'error', 'message': f"{len(chunk)} kayıtlık parça gönderilemedi. {message}", 'progress': progress}
+            else:
+                # IYS accepted the request, but its outcome could not be read
+                counts['unknown'] += len(chunk)
+                yield {'status': 'error', 'message': f"Talep {request_id} gönderildi ancak sonucu alınamadı, lütfen IYS panelinden kontrol edin. {message}", 'progress': progress}
+            return
+
+        if status_result is None:
+            counts['unknown'] += len(chunk)
+            yield {'status': 'warning', 'message': f"Talep {request_id} sonucu beklenenden uzun sürdü. Lütfen IYS panelinden kontrol edin.", 'progress': progress}
+            return
+
+        failures = []
+        for item in status_result:
+            item_status = item.get("status", "").lower()
+            original_index = item.get('index', -1)
+
+            recipient = 'Bilinmeyen Alıcı'
+            if 0 <= original_index < len(chunk):
+                recipient = chunk[original_index][0]
+
+            if item_status in ["success", "completed"]:
+                counts['success'] += 1
+            else: # failure or any other error status
+                counts['failure'] += 1
+                error_info = item.get('error', {})
+                error_message = error_info.get('message', 'Bilinmeyen hata.')
+                failures.append(f"Alıcı {recipient} (Talep {request_id}, Sıra #{original_index}) başarısız: {error_message}")
+
+        if failures:
+            # One update per chunk keeps the UI responsive when many items fail
+            for failure in failures:
+                logging.error(failure)
+            yield {'status': 'error', 'message': '  \n'.join(failures), 'progress': progress}
+
+        yield {'status': 'info', 'message': f"Talep {request_id} tamamlandı.", 'progress': progress}
+
+    def _coalesce_updates(self, updates: Iterable[Dict[str, Any]]) -> Generator[Dict[str, Any], None, None]:
+        """Batches status updates so the UI re-renders at most once per update_interval; no update is dropped."""
+        buffered: Dict[str, List[str]] = {}
+        progress = 0.0
+        last_yield = 0.0
+
+        def flush() -> Generator[Dict[str, Any], None, None]:
+            # One update per status so error/warning styling is kept in the UI
+            for status, messages in buffered.items():
+                yield {'status': status, 'message': '  \n'.join(messages), 'progress': progress}
+            buffered.clear()
+
+        for update in updates:
+            now = time.monotonic()
+            if update['status'] == 'tick':
+                # Emitted by the pipeline while it waits, so buffered updates never sit until the next event
+                if buffered and now - last_yield >= self.update_interval:
+                    yield from flush()
+                    last_yield = now
+                continue
+
+            # Final and result updates (success, errors, summary, completion) are never delayed or merged
+            if update['status'] in _FLUSH_STATUSES or update.get('progress', 0.0) >= 1.0:
+                yield from flush()
+                yield update
+                last_yield = now
+                continue
+
+            progress = update.get('progress', progress)
+            buffered.setdefault(update['status'], []).append(update['message'])
+            if now - last_yield >= self.update_interval:
+                yield from flush()
+                last_yield = now
+        yield from flush()
+
+    def process_dataframe(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], total_rows: Optional[int] = None,
+                          keep_rows: Optional[np.ndarray] = None) -> Generator[Dict[str, Any], None, None]:
+        """Processes a DataFrame, or an iterator of DataFrame chunks read from a CSV, and yields status updates.
+
+        Chunks are uploaded while the next ones are still being read. For an iterator, `keep_rows` is the
+        last_occurrence_mask of the whole file's 'ALICI'/'IZIN TURU' columns, so duplicates are removed across
+        chunks; without it they are only removed within each DataFrame. `total_rows` is only used to estimate progress.
+        """
+        if isinstance(data, pd.DataFrame):
+            keep_rows = self.last_occurrence_mask(data)
+        yield from self._coalesce_updates(self._process_frames(data, total_rows, keep_rows))
+
+    def _process_frames(self, data: Union[pd.DataFrame, Iterable[pd.DataFrame]], total_rows: Optional[int],
+                        keep_rows: Optional[np.ndarray]) -> Generator[Dict[str, Any], None, None]:
+        """Runs the upload pipeline and yields every status update."""
+        frames = [data] if isinstance(data, pd.DataFrame) else data
         try:
             if not self.get_token():
                 yield {'status': 'error', 'message': "IYS kimlik doğrulaması başarısız. Lütfen bilgileri kontrol edin.", 'progress': 0.0}
@@ -118,85 +600,77 @@ class IYSConsentUploader:
 
             yield {'status': 'info', 'message': 'İzin verileri hazırlanıyor...', 'progress': 0.1}
 
-            # Deduplicate based on recipient and type
-            original_count = len(df)
-            df_deduplicated = df.drop_duplicates(subset=['ALICI', 'IZIN TURU'], keep='last').copy()
-            deduplicated_count = len(df_deduplicated)
-            if original_count > deduplicated_count:
-                removed_count = original_count - deduplicated_count
-                yield {'status': 'warning', 'message': f"{removed_count} adet tekrar eden kayıt bulundu ve listeden kaldırıldı.", 'progress': 0.15}
+            # Compute the poll schedule once per upload instead of once per chunk
+            self._poll_schedule = self.poll_delays()
+            expected_chunks = math.ceil(total_rows / self.chunk_size) if total_rows else 0
+            stats = {'submitted': 0, 'done': 0}
+            counts = {'success': 0, 'failure': 0, 'unknown': 0, 'skipped': 0}
+            producer_error = None
 
-            consent_list = []
-            for _, row in df_deduplicated.iterrows():
-                # Ensure type and source are strings to prevent errors with empty cells (NaN)
-                izin_turu = str(row['IZIN TURU']) if pd.notna(row['IZIN TURU']) else ''
-                izin_kaynagi = str(row['IZIN KAYNAGI']) if pd.notna(row['IZIN KAYNAGI']) else ''
+            # Poll progress of requests still being checked, as a fraction of their poll schedule
+            in_flight: Dict[str, float] = {}
 
-                # Skip rows with no permission type
-                if not izin_turu:
-                    continue
-
-                consent_list.append({
-                    "type": izin_turu.upper(),
-                    "status": "ONAY" if int(row['ONAY(1)-RET(0)']) == 1 else "RET",
-                    "source": izin_kaynagi,
-                    "recipient": self.format_phone_number(row['ALICI']),
-                    "recipientType": "BIREYSEL",
-                    "consentDate": pd.to_datetime(row['IZIN TARIHI'], format='%d-%m-%Y %H:%M:%S').strftime('%Y-%m-%d %H:%M:%S'),
-                })
-            
-            if not consent_list:
+            def progress() -> float:
+                done = stats['done'] + sum(in_flight.values())
+                return 0.3 + 0.7 * min(done / max(expected_chunks, stats['submitted'], 1), 0.99)
+
+            # Parsing and payload building run in a producer thread while the workers upload earlier chunks
+            chunk_queue = queue.Queue(maxsize=4)
+            events = queue.Queue()
+            stop = threading.Event()
+            threading.Thread(target=self._produce_chunks, args=(frames, keep_rows, chunk_queue, events, stats, stop), daemon=True).start()
+            for _ in range(self.max_workers):
+                threading.Thread(target=self._consume_chunks, args=(chunk_queue, events, stop), daemon=True).start()
+
+            try:
+                active_workers = self.max_workers
+                while active_workers:
+                    try:
+                        kind, payload = events.get(timeout=self.update_interval)
+                    except queue.Empty:
+                        yield {'status': 'tick', 'message': '', 'progress': progress()}
+                        continue
+                    if kind == 'done':
+                        active_workers -= 1
+                    elif kind == 'error':
+                        # Stop submitting, but keep reporting the requests that are already with IYS
+                        producer_error = payload
+                        stop.set()
+                        logging.error(f"Error while reading the file: {str(payload)}")
+                        yield {'status': 'error', 'message': f"Dosya okunurken hata oluştu, yeni istek gönderilmeyecek: {str(payload)}", 'progress': progress()}
+                    elif kind == 'skipped':
+                        stats['done'] += 1
+                        counts['skipped'] += len(payload)
+                    elif kind == 'event':
+                        yield {**payload, 'progress': progress()}
+                    elif kind == 'poll':
+                        request_id, attempt, attempts = payload
+                        in_flight[request_id] = attempt / (attempts + 1)
+                        yield {'status': 'info', 'message': f"Talep {request_id} sonuçları kontrol ediliyor... (Deneme {attempt}/{attempts})", 'progress': progress()}
+                    else:
+                        stats['done'] += 1
+                        chunk, result = payload
+                        in_flight.pop(result[0], None)
+                        yield from self._report_chunk(chunk, result, progress(), counts)
+            finally:
+                stop.set()
+
+            if producer_error is not None:
+                yield {'status': 'error', 'message': f"Dosya hatası nedeniyle yükleme yarıda kesildi, dosya kısmen yüklendi. Başarılı: {counts['success']}, "
+                                                     f"Başarısız: {counts['failure']}, Sonucu bilinmeyen: {counts['unknown']}, Gönderilmeyen: {counts['skipped']} ve dosyanın kalanı. "
+                                                     f"Hatayı düzelttikten sonra dosyayı yeniden yükleyin.", 'progress': 1.0}
+                return
+
+            if not stats['submitted']:
                 yield {'status': 'warning', 'message': 'Yüklenecek geçerli bir kayıt bulunamadı.', 'progress': 1.0}
                 return
 
-            yield {'status': 'info', 'message': f"{len(consent_list)} adet izin isteği gönderiliyor...", 'progress': 0.3}
-            request_id = self.add_consents(consent_list)
-            yield {'status': 'success', 'message': f"İstek başarıyla gönderildi. Talep ID: {request_id}", 'progress': 0.5}
-
-            # Polling for status
-            for i in range(12): # Poll for up to 2 minutes (12 * 10s)
-                time.sleep(10)
-                progress = 0.5 + (i + 1) * (0.5 / 12)
-                yield {'status': 'info', 'message': f"Sonuçlar kontrol ediliyor... (Deneme {i+1}/12)", 'progress': progress}
-                
-                status_result = self.check_consent_status(request_id)
-                
-                if isinstance(status_result, list) and status_result:
-                    # The job is done only if NO items are currently being processed.
-                    is_processing = any(item.get("status", "").lower() in ["enqueue", "processing"] for item in status_result)
-
-                    if not is_processing:
-                        yield {'status': 'info', 'message': "İşlem tamamlandı, sonuçlar işleniyor...", 'progress': 0.9}
-                        
-                        success_count = 0
-                        failure_count = 0
-
-                        # Create a list of recipients to map API response index to phone number
-                        recipient_list = df_deduplicated['ALICI'].tolist()
-
-                        for item in status_result:
-                            item_status = item.get("status", "").lower()
-                            original_index = item.get('index', -1)
-                            
-                            recipient = 'Bilinmeyen Alıcı'
-                            if 0 <= original_index < len(recipient_list):
-                                recipient = self.format_phone_number(recipient_list[original_index])
-
-                            if item_status in ["success", "completed"]:
-                                success_count += 1
-                            else: # failure or any other error status
-                                failure_count += 1
-                                error_info = item.get('error', {})
-                                error_message = error_info.get('message', 'Bilinmeyen hata.')
-                                yield {'status': 'error', 'message': f"Alıcı {recipient} (Sıra #{original_index}) başarısız: {error_message}"}
-                        
-                        summary_message = f"İşlem tamamlandı. Başarılı: {success_count}, Başarısız: {failure_count}."
-                        final_status = 'success' if failure_count == 0 else 'warning'
-                        yield {'status': final_status, 'message': summary_message, 'progress': 1.0}
-                        yield {'status': 'complete', 'message': 'Tüm işlemler bitti.', 'progress': 1.0}
-                        return
-
-            yield {'status': 'warning', 'message': "Sonuç beklenenden uzun sürdü. Lütfen IYS panelinden kontrol edin.", 'progress': 1.0}
+            summary_message = f"İşlem tamamlandı. Başarılı: {counts['success']}, Başarısız: {counts['failure']}."
+            if counts['unknown']:
+                summary_message += f" Sonucu bilinmeyen: {counts['unknown']} (IYS panelinden kontrol edin)."
+            final_status = 'success' if counts['failure'] == 0 and counts['unknown'] == 0 else 'warning'
+            yield {'status': final_status, 'message': summary_message, 'progress': 1.0}
+            yield {'status': 'complete', 'message': 'Tüm işlemler bitti.', 'progress': 1.0}
 
         except requests.exceptions.HTTPError as e:
             error_details = e.response.text if e.response is not None else "No details from server."
@@ -0,0 +1,13 @@
+import pytest
+
+from src.iys_uploader import IYSConsentUploader
+
+
+@pytest.fixture
+def uploader(monkeypatch, tmp_path):
+    """An uploader with dummy credentials whose poll history is kept out of the working directory."""
+    monkeypatch.setenv('IYS_USERNAME', 'user')
+    monkeypatch.setenv('IYS_PASSWORD', 'secret')
+    uploader = IYSConsentUploader(token_cache={})
+    uploader.poll_history_path = str(tmp_path / 'iys_poll_history.csv')
+    return uploader
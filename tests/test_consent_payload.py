@@ -0,0 +1,64 @@
+import orjson
+import pandas as pd
+
+
+def _frame(dates, types=None, sources=None):
+    n = len(dates)
+    return pd.DataFrame({
+        'ALICI': ['05321234567'] * n,
+        'IZIN TURU': types or ['ARAMA'] * n,
+        'IZIN KAYNAGI': sources or ['HS_WEB'] * n,
+        'ONAY(1)-RET(0)': [1, 0] * (n // 2) + [1] * (n % 2),
+        'IZIN TARIHI': dates,
+    })
+
+
+def _submitted_body(uploader, consent_list):
+    sent = {}
+
+    class Response:
+        content = b'{"requestId": "req-1"}'
+
+    def send(method, url, **kwargs):
+        sent.update(kwargs, method=method, url=url)
+        return Response()
+
+    uploader._send = send
+    assert uploader.add_consents(consent_list) == 'req-1'
+    assert sent['method'] == 'POST' and sent['url'] == uploader.consent_url
+    return orjson.loads(sent['data'])
+
+
+def test_body_escapes_type_and_source(uploader):
+    df = _frame(['01-02-2024 10:00:00'] * 2, types=['MESAJ', 'ARAMA'], sources=['say "hi"', 'back\\slash\n'])
+    body = _submitted_body(uploader, uploader.build_consent_list(df))
+    assert body == [
+        {'recipient': '+905321234567', 'type': 'MESAJ', 'source': 'say "hi"', 'status': 'ONAY',
+         'consentDate': '2024-02-01 10:00:00', 'recipientType': 'BIREYSEL'},
+        {'recipient': '+905321234567', 'type': 'ARAMA', 'source': 'back\\slash\n', 'status': 'RET',
+         'consentDate': '2024-02-01 10:00:00', 'recipientType': 'BIREYSEL'},
+    ]
+
+
+def test_missing_source_is_sent_as_empty_string(uploader):
+    df = _frame(['01-02-2024 10:00:00'], sources=[None])
+    assert _submitted_body(uploader, uploader.build_consent_list(df))[0]['source'] == ''
+
+
+def test_date_fast_path_and_fallback_agree(uploader):
+    fast = uploader.build_consent_list(_frame(['05-03-2024 09:07:08', '31-12-2023 23:59:59']))
+    # One unpadded value disables the string fast path for the whole column
+    fallback = uploader.build_consent_list(_frame(['5-3-2024 09:07:08', '31-12-2023 23:59:59']))
+    assert [row[4] for row in fast] == ['2024-03-05 09:07:08', '2023-12-31 23:59:59']
+    assert [row[4] for row in fallback] == [row[4] for row in fast]
+
+
+def test_invalid_dates_are_skipped(uploader):
+    rows = uploader.build_consent_list(_frame(['01-02-2024 10:00:00', 'not a date', '31-02-2024 10:00:00']))
+    assert [row[4] for row in rows] == ['2024-02-01 10:00:00']
+
+
+def test_invalid_phone_numbers_are_skipped(uploader):
+    df = _frame(['01-02-2024 10:00:00'] * 3)
+    df['ALICI'] = ['0532 123 45 67', '', '12345']
+    assert [row[0] for row in uploader.build_consent_list(df)] == ['+905321234567']
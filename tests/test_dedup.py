@@ -0,0 +1,43 @@
+import queue
+import threading
+
+import numpy as np
+import pandas as pd
+
+
+def _frame(rows):
+    return pd.DataFrame(rows, columns=['ALICI', 'IZIN TURU', 'IZIN KAYNAGI', 'ONAY(1)-RET(0)', 'IZIN TARIHI'])
+
+
+def _produce(uploader, frames, keep_rows):
+    chunk_queue, events = queue.Queue(), queue.Queue()
+    stats = {'submitted': 0}
+    uploader._produce_chunks(frames, keep_rows, chunk_queue, events, stats, threading.Event())
+    chunks = [chunk for chunk in iter(chunk_queue.get_nowait, None)]
+    return [row for chunk in chunks for row in chunk], list(events.queue)
+
+
+def test_last_occurrence_mask_keeps_last_row_per_key(uploader):
+    keys = pd.DataFrame({'ALICI': ['1', '2', '1', '1'], 'IZIN TURU': ['ARAMA', 'ARAMA', 'MESAJ', 'ARAMA']})
+    assert uploader.last_occurrence_mask(keys).tolist() == [False, True, True, True]
+
+
+def test_whole_file_mask_deduplicates_across_read_chunks(uploader):
+    first = _frame([
+        ['5321234567', 'ARAMA', 'HS_WEB', 1, '01-02-2024 10:00:00'],
+        ['5551234567', 'MESAJ', 'HS_WEB', 1, '01-02-2024 10:00:00'],
+    ])
+    # The later RET for the same recipient and type is in the next chunk and must win
+    second = _frame([['5321234567', 'ARAMA', 'HS_WEB', 0, '02-02-2024 10:00:00']])
+    keep_rows = uploader.last_occurrence_mask(pd.concat([first, second], ignore_index=True))
+
+    rows, events = _produce(uploader, [first, second], keep_rows)
+    assert sorted((row[0], row[3]) for row in rows) == [('+905321234567', 'RET'), ('+905551234567', 'ONAY')]
+    assert ('event', {'status': 'warning', 'message': "1 adet tekrar eden kayıt bulundu ve listeden kaldırıldı."}) in events
+
+
+def test_mask_length_mismatch_is_reported(uploader):
+    frame = _frame([['5321234567', 'ARAMA', 'HS_WEB', 1, '01-02-2024 10:00:00']])
+    rows, events = _produce(uploader, [frame, frame], np.ones(1, dtype=bool))
+    assert len(rows) == 1
+    assert events[-1][0] == 'error' and isinstance(events[-1][1], ValueError)
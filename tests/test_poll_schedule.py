@@ -0,0 +1,50 @@
+import math
+import random
+
+from src.iys_uploader import _lognormal_poll_times
+
+
+def _samples(mu, sigma, n=200, seed=0):
+    rng = random.Random(seed)
+    return [rng.lognormvariate(mu, sigma) for _ in range(n)]
+
+
+def _p99(samples):
+    logs = [math.log(t) for t in samples]
+    mu = sum(logs) / len(logs)
+    sigma = math.sqrt(sum((x - mu) ** 2 for x in logs) / len(logs))
+    return math.exp(mu + 2.326 * sigma)
+
+
+def test_lognormal_poll_times_are_increasing():
+    times = _lognormal_poll_times(_samples(2.5, 0.6), 8)
+    assert len(times) == 8
+    assert times[0] > 0
+    assert all(a < b for a, b in zip(times, times[1:]))
+
+
+def test_lognormal_poll_times_end_at_99th_percentile():
+    samples = _samples(1.0, 0.3)
+    times = _lognormal_poll_times(samples, 8)
+    assert math.isclose(times[-1], _p99(samples), rel_tol=1e-3)
+
+
+def test_lognormal_poll_times_need_spread():
+    assert _lognormal_poll_times([3.0] * 10, 8) == []
+    assert _lognormal_poll_times([], 8) == []
+
+
+def test_poll_delays_keep_minimum_gap_and_attempt_cap(uploader):
+    for t in _samples(math.log(2.2), 0.05, n=20):
+        uploader._record_poll_time(1000, t)
+    delays = uploader.poll_delays()
+    assert len(delays) <= uploader.poll_max_attempts
+    assert min(delays) >= uploader.poll_initial_delay
+    assert math.isclose(sum(delays), uploader.poll_timeout)
+
+
+def test_poll_delays_without_history_are_geometric(uploader):
+    delays = uploader.poll_delays()
+    assert delays[0] == uploader.poll_initial_delay
+    assert all(math.isclose(b / a, uploader.poll_growth) for a, b in zip(delays, delays[1:]))
+    assert sum(delays[:-1]) < uploader.poll_timeout <= sum(delays)
@@ -0,0 +1,35 @@
+import threading
+import time
+
+from src.iys_uploader import TokenBucket
+
+
+def test_burst_is_not_delayed():
+    bucket = TokenBucket(rate=5.0, burst=10)
+    started = time.monotonic()
+    for _ in range(10):
+        bucket.acquire()
+    assert time.monotonic() - started < 0.05
+
+
+def test_calls_past_the_burst_are_paced_at_rate():
+    bucket = TokenBucket(rate=20.0, burst=2)
+    bucket.acquire()
+    bucket.acquire()
+    started = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    elapsed = time.monotonic() - started
+    assert 4 / 20.0 - 0.02 <= elapsed < 4 / 20.0 + 0.15
+
+
+def test_rate_holds_across_threads():
+    bucket = TokenBucket(rate=50.0, burst=1)
+    bucket.acquire()
+    started = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.monotonic() - started >= 10 / 50.0 - 0.02